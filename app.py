@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
+import io
+import json
 import os
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
 
 # ------------------------------------------------------------------------
 # Force Qt to use an offscreen platform plugin (avoid "could not connect to display" error)
@@ -9,25 +16,49 @@ import os
 os.environ["QT_QPA_PLATFORM"] = "offscreen"
 
 from music21 import (
-    stream, note, key, scale, clef, instrument,
-    environment, expressions, duration, layout
+    stream, note, pitch, key, scale, clef, instrument,
+    environment, expressions, layout
 )
-from PyPDF2 import PdfMerger
+from music21.musicxml.m21ToXml import GeneralObjectExporter
+import orjson
+import pikepdf
 from flask import Flask, request, send_file
 
 
 # ------------------------------------------------------------------------
 # Configuration: Point music21 to MuseScore 3 (adjust if necessary)
 # ------------------------------------------------------------------------
-if os.path.exists('/usr/bin/musescore3'):  # Path for MuseScore in Linux (Cloud Run)
-    environment.set('musicxmlPath', '/usr/bin/musescore3')
-    environment.set('musescoreDirectPNGPath', '/usr/bin/musescore3')
-elif os.path.exists('/Applications/MuseScore 3.app/Contents/MacOS/mscore'):  # macOS path
-    environment.set('musicxmlPath', '/Applications/MuseScore 3.app/Contents/MacOS/mscore')
-    environment.set('musescoreDirectPNGPath', '/Applications/MuseScore 3.app/Contents/MacOS/mscore')
-else:
+MUSESCORE_CANDIDATES = (
+    '/usr/bin/musescore3',                                 # Linux (Cloud Run)
+    '/Applications/MuseScore 3.app/Contents/MacOS/mscore',  # macOS
+)
+MUSESCORE_PATH = next((p for p in MUSESCORE_CANDIDATES if os.path.exists(p)), None)
+if MUSESCORE_PATH is None:
     raise EnvironmentError("MuseScore executable not found. Check your installation.")
 
+# Seconds before a MuseScore run is killed; kept below gunicorn's --timeout 120 (see Dockerfile)
+MUSESCORE_TIMEOUT = 110
+
+# Only touch music21's settings file when the stored path is actually stale
+_m21_env = environment.Environment()
+for _m21_key in ('musicxmlPath', 'musescoreDirectPNGPath'):
+    if str(_m21_env[_m21_key]) != MUSESCORE_PATH:
+        environment.set(_m21_key, MUSESCORE_PATH)
+
+# ------------------------------------------------------------------------
+# Scratch space for intermediate MusicXML/PDF files: RAM-backed tmpfs when available
+# ------------------------------------------------------------------------
+SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# ------------------------------------------------------------------------
+# Finished PDFs, keyed by a hash of the request parameters (override with N2PDF_CACHE_DIR)
+# ------------------------------------------------------------------------
+CACHE_DIR = os.environ.get('N2PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'n2pdf-cache'))
+# Least recently used entries are evicted beyond this many bytes (override with N2PDF_CACHE_MAX_BYTES)
+CACHE_MAX_BYTES = int(os.environ.get('N2PDF_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Bump whenever rendering output changes so persistent caches stop serving old PDFs
+CACHE_VERSION = 1
+
 # ------------------------------------------------------------------------
 # Enharmonic mapping: name -> (newName, octaveAdjustment)
 # ------------------------------------------------------------------------
@@ -38,6 +69,14 @@ ENHARM_MAP = {
     "Fb": ("E", 0),
 }
 
+# ------------------------------------------------------------------------
+# Note lengths in quarterLength units; each Note gets its own Duration from these
+# (music21 writes per-note export state such as tuplet start/stop onto the Duration)
+# ------------------------------------------------------------------------
+QL_QUARTER = 1.0
+QL_EIGHTH = 0.5
+QL_WHOLE = 4.0
+
 # ------------------------------------------------------------------------
 # Easiest playable note (defaults to "C4" if not found)
 # ------------------------------------------------------------------------
@@ -50,19 +89,28 @@ EASIEST_NOTE_MAP = {
     # Add more instruments and their easy notes as desired
 }
 
+# ------------------------------------------------------------------------
+# Request defaults, built once rather than on every request
+# ------------------------------------------------------------------------
+DEFAULT_KEYS = ("F#", "C", "G", "A", "B", "D", "E", "Eb")
+DEFAULT_CUSTOM_RHYTHM = ((1,), (0.5, 0.5))
+
 
-def fix_enharmonic_spelling(n):
-    """Adjust the note spelling (e.g., E# -> F) and ensure accidentals are displayed."""
-    if not n.pitch:
-        return
-    original_name = n.pitch.name
-    if original_name in ENHARM_MAP:
-        new_name, octave_adjust = ENHARM_MAP[original_name]
-        n.pitch.name = new_name
-        n.pitch.octave += octave_adjust
-    if n.pitch.accidental is not None:
-        n.pitch.accidental.displayStatus = True
-        n.pitch.accidental.displayType = 'normal'
+@lru_cache(maxsize=64)
+def _major_scale(key_signature):
+    """Return the (read-only) MajorScale for the given tonic."""
+    return scale.MajorScale(key_signature)
+
+
+def respell_pitch(p):
+    """Return the pitch respelled (e.g., E# -> F) with any accidental set to display."""
+    if p.name in ENHARM_MAP:
+        new_name, octave_adjust = ENHARM_MAP[p.name]
+        p = pitch.Pitch(new_name, octave=p.octave + octave_adjust)
+    if p.accidental is not None:
+        p.accidental.displayStatus = True
+        p.accidental.displayType = 'normal'
+    return p
 
 
 def determine_clef_and_octave(instrument_name, part='right'):
@@ -107,64 +155,41 @@ def determine_clef_and_octave(instrument_name, part='right'):
     return instrument_map.get(instrument_name, ("TrebleClef", 4))
 
 
-def create_scale_measures(title_text, scale_object, octave_start, num_octaves):
-    """Create measure streams for ascending/descending scales."""
-    measures_stream = stream.Stream()
-    pitches_up = scale_object.getPitches(f"{scale_object.tonic.name}{octave_start}",
-                                         f"{scale_object.tonic.name}{octave_start + num_octaves}")
+def _build_measures(title_text, all_pitches, body_lengths, notes_per_measure):
+    """Group pitches into measures; the final pitch becomes a whole note in a measure of its own."""
+    if not all_pitches:
+        return []
+    body_pitches = all_pitches[:-1]
+    num_body_measures = -(-len(body_pitches) // notes_per_measure)
+
+    # Collect plain lists first; building each Measure from its full note list
+    # lets music21 do its offset bookkeeping once per measure instead of per note
+    note_groups = [[] for _ in range(num_body_measures + 1)]
+    for i, (p, ql) in enumerate(zip(body_pitches, body_lengths)):
+        note_groups[i // notes_per_measure].append(note.Note(p, quarterLength=ql))
+    note_groups[-1].append(note.Note(all_pitches[-1], quarterLength=QL_WHOLE))
+
+    measures = [stream.Measure(notes) for notes in note_groups]
+    txt = expressions.TextExpression(title_text)
+    txt.placement = 'above'
+    measures[0].insert(0, txt)
+    return measures
+
+
+def create_scale_measures(title_text, pitches_up):
+    """Create the measures of an ascending/descending scale."""
     pitches_down = list(reversed(pitches_up[:-1]))
     all_pitches = pitches_up + pitches_down
 
+    # Each 7-note measure opens with a quarter note, followed by eighths
     notes_per_measure = 7
-    current_measure = stream.Measure()
-    note_counter = 0
-
-    for i, p in enumerate(all_pitches):
-        # If this is the last note, treat it as a whole note in a new measure
-        if i == len(all_pitches) - 1:
-            if current_measure.notes:
-                measures_stream.append(current_measure)
-            m_whole = stream.Measure()
-            if i == 0:
-                txt = expressions.TextExpression(title_text)
-                txt.placement = 'above'
-                m_whole.insert(0, txt)
-            n = note.Note(p)
-            n.duration = duration.Duration('whole')
-            fix_enharmonic_spelling(n)
-            m_whole.append(n)
-            measures_stream.append(m_whole)
-            break
+    body_lengths = [QL_QUARTER if i % notes_per_measure == 0 else QL_EIGHTH
+                    for i in range(len(all_pitches) - 1)]
+    return _build_measures(title_text, all_pitches, body_lengths, notes_per_measure)
+
 
-        pos_in_measure = note_counter % notes_per_measure
-        if pos_in_measure == 0:
-            if current_measure.notes:
-                measures_stream.append(current_measure)
-            current_measure = stream.Measure()
-            if i == 0:
-                txt = expressions.TextExpression(title_text)
-                txt.placement = 'above'
-                current_measure.insert(0, txt)
-            n = note.Note(p)
-            n.duration = duration.Duration('quarter')
-            fix_enharmonic_spelling(n)
-            current_measure.append(n)
-        else:
-            n = note.Note(p)
-            n.duration = duration.Duration('eighth')
-            fix_enharmonic_spelling(n)
-            current_measure.append(n)
-
-        note_counter += 1
-
-    return measures_stream
-
-
-def create_arpeggio_measures(title_text, scale_object, octave_start, num_octaves):
-    """Create measure streams for ascending/descending arpeggios."""
-    measures_stream = stream.Stream()
-    scale_pitches = scale_object.getPitches(f"{scale_object.tonic.name}{octave_start}",
-                                            f"{scale_object.tonic.name}{octave_start + num_octaves}")
+def create_arpeggio_measures(title_text, scale_pitches, num_octaves):
+    """Create the measures of an ascending/descending arpeggio."""
     arpeggio_up = []
     # Construct arpeggio (root, third, fifth, [octave])
     for o in range(num_octaves):
@@ -187,43 +212,8 @@ def create_arpeggio_measures(title_text, scale_object, octave_start, num_octaves
     all_arpeggio_pitches = arpeggio_up + arpeggio_down
 
     notes_per_measure = 8
-    current_measure = stream.Measure()
-    note_counter = 0
-
-    for i, p in enumerate(all_arpeggio_pitches):
-        # Last note as a whole note in a new measure
-        if i == len(all_arpeggio_pitches) - 1:
-            if current_measure.notes:
-                measures_stream.append(current_measure)
-            m_whole = stream.Measure()
-            if i == 0:
-                txt = expressions.TextExpression(title_text)
-                txt.placement = 'above'
-                m_whole.insert(0, txt)
-            n = note.Note(p)
-            n.duration = duration.Duration('whole')
-            fix_enharmonic_spelling(n)
-            m_whole.append(n)
-            measures_stream.append(m_whole)
-            break
-
-        pos_in_measure = note_counter % notes_per_measure
-        if pos_in_measure == 0:
-            if current_measure.notes:
-                measures_stream.append(current_measure)
-            current_measure = stream.Measure()
-            if i == 0:
-                txt = expressions.TextExpression(title_text)
-                txt.placement = 'above'
-                current_measure.insert(0, txt)
-
-        n = note.Note(p)
-        n.duration = duration.Duration('eighth')
-        fix_enharmonic_spelling(n)
-        current_measure.append(n)
-        note_counter += 1
-
-    return measures_stream
+    body_lengths = [QL_EIGHTH] * (len(all_arpeggio_pitches) - 1)
+    return _build_measures(title_text, all_arpeggio_pitches, body_lengths, notes_per_measure)
 
 
 def create_part_for_single_key_scales_arpeggios(key_signature, num_octaves, instrument_name):
@@ -234,7 +224,7 @@ def create_part_for_single_key_scales_arpeggios(key_signature, num_octaves, inst
     part.insert(0, layout.SystemLayout(isNew=True))
 
     major_key_obj = key.Key(key_signature, 'major')
-    major_scale_obj = scale.MajorScale(key_signature)
+    major_scale_obj = _major_scale(key_signature)
 
     clef_octave = determine_clef_and_octave(instrument_name)
     if isinstance(clef_octave, dict):
@@ -242,35 +232,35 @@ def create_part_for_single_key_scales_arpeggios(key_signature, num_octaves, inst
     else:
         selected_clef, octave_start = clef_octave
 
+    # Enumerate (and respell) the scale once; both the scale and arpeggio builders share it
+    tonic = major_scale_obj.tonic.name
+    pitches_up = major_scale_obj.getPitches(f"{tonic}{octave_start}",
+                                            f"{tonic}{octave_start + num_octaves}")
+    pitches_up = [respell_pitch(p) for p in pitches_up]
+
     # Create scales
     scale_measures = create_scale_measures(
         title_text=f"{key_signature} Major Scale",
-        scale_object=major_scale_obj,
-        octave_start=octave_start,
-        num_octaves=num_octaves
+        pitches_up=pitches_up
     )
-
     if scale_measures:
         first_m = scale_measures[0]
         first_m.insert(0, getattr(clef, selected_clef)())
         first_m.insert(0, major_key_obj)
-        for m in scale_measures:
-            part.append(m)
+        part.append(scale_measures)
 
     part.append(layout.SystemLayout(isNew=True))
 
     # Create arpeggios
     arpeggio_measures = create_arpeggio_measures(
         title_text=f"{key_signature} Major Arpeggio",
-        scale_object=major_scale_obj,
-        octave_start=octave_start,
+        scale_pitches=pitches_up,
         num_octaves=num_octaves
     )
     if arpeggio_measures:
         first_arp = arpeggio_measures[0]
         first_arp.insert(0, major_key_obj)
-        for m in arpeggio_measures:
-            part.append(m)
+        part.append(arpeggio_measures)
 
     return part
 
@@ -282,33 +272,34 @@ def create_custom_rhythm_part(title_text, custom_rhythm, instrument_name):
     part.insert(0, instr_obj)
     part.insert(0, layout.SystemLayout(isNew=True))
 
-    easiest_note = EASIEST_NOTE_MAP.get(instrument_name, "C4")
-    measures_stream = stream.Stream()
-
-    for measure_index, measure_durations in enumerate(custom_rhythm):
-        current_measure = stream.Measure()
-        if measure_index == 0:
-            txt = expressions.TextExpression(title_text)
-            txt.placement = 'above'
-            current_measure.insert(0, txt)
+    easiest_pitch = respell_pitch(pitch.Pitch(EASIEST_NOTE_MAP.get(instrument_name, "C4")))
 
+    measures = []
+    for measure_durations in custom_rhythm:
+        notes = []
         for val in measure_durations:
-            n = note.Note(easiest_note)
-            fix_enharmonic_spelling(n)
             # Multiply val by 4 to convert quarter=1.0 => val * 4
-            n.duration = duration.Duration(val * 4)
-            current_measure.append(n)
-
-        measures_stream.append(current_measure)
+            notes.append(note.Note(easiest_pitch, quarterLength=val * 4))
+        measures.append(stream.Measure(notes))
 
-    for m in measures_stream:
-        part.append(m)
+    if measures:
+        txt = expressions.TextExpression(title_text)
+        txt.placement = 'above'
+        measures[0].insert(0, txt)
+        part.append(measures)
 
     return part
 
 
-def generate_scales_arpeggios_pdf(output_folder, keys, num_octaves, instrument_name):
-    """Generate a PDF with scales and arpeggios for the provided keys."""
+def write_musicxml(score, xml_path):
+    """Serialize a score with music21's MusicXML exporter, skipping the write() format dispatch."""
+    with open(xml_path, 'wb') as f:
+        f.write(GeneralObjectExporter(score).parse())
+    return xml_path
+
+
+def generate_scales_arpeggios_xml(output_folder, keys, num_octaves, instrument_name):
+    """Write a MusicXML file with scales and arpeggios for the provided keys."""
     os.makedirs(output_folder, exist_ok=True)
     scales_arpeggios_score = stream.Score()
 
@@ -320,14 +311,12 @@ def generate_scales_arpeggios_pdf(output_folder, keys, num_octaves, instrument_n
         )
         scales_arpeggios_score.append(part_for_key)
 
-    scales_pdf = os.path.join(output_folder, "ScalesAndArpeggios.pdf")
-    # Use 'musicxml.pdf' to create a PDF via MuseScore
-    scales_arpeggios_score.write('musicxml.pdf', fp=scales_pdf)
-    return scales_pdf
+    scales_xml = os.path.join(output_folder, "ScalesAndArpeggios.musicxml")
+    return write_musicxml(scales_arpeggios_score, scales_xml)
 
 
-def generate_custom_rhythm_pdf(output_folder, custom_rhythm_example, title, instrument_name):
-    """Generate a PDF for the given custom rhythm example."""
+def generate_custom_rhythm_xml(output_folder, custom_rhythm_example, title, instrument_name):
+    """Write a MusicXML file for the given custom rhythm example."""
     os.makedirs(output_folder, exist_ok=True)
     custom_rhythm_score = stream.Score()
 
@@ -338,21 +327,118 @@ def generate_custom_rhythm_pdf(output_folder, custom_rhythm_example, title, inst
     )
     custom_rhythm_score.append(custom_rhythm_part)
 
-    custom_pdf = os.path.join(output_folder, "CustomRhythm.pdf")
-    custom_rhythm_score.write('musicxml.pdf', fp=custom_pdf)
-    return custom_pdf
+    custom_xml = os.path.join(output_folder, "CustomRhythm.musicxml")
+    return write_musicxml(custom_rhythm_score, custom_xml)
 
 
-def merge_pdfs(pdf_list, output_path):
-    """Merge multiple PDF files into a single output file."""
-    merger = PdfMerger()
+def render_pdfs_batch(xml_list):
+    """Convert MusicXML files to PDFs with a single MuseScore process in batch-job mode."""
+    pdf_list = [os.path.splitext(xml)[0] + ".pdf" for xml in xml_list]
+
+    # One job file per call, next to its inputs, so MuseScore starts only once
+    jobs_path = os.path.join(os.path.dirname(xml_list[0]), "jobs.json")
+    with open(jobs_path, 'w') as f:
+        json.dump([{"in": xml, "out": pdf} for xml, pdf in zip(xml_list, pdf_list)], f)
+
+    subprocess.run([MUSESCORE_PATH, '-j', jobs_path], check=True, timeout=MUSESCORE_TIMEOUT,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     for pdf in pdf_list:
-        merger.append(pdf)
-    merger.write(output_path)
-    merger.close()
+        if not os.path.exists(pdf):
+            raise FileNotFoundError(f"MuseScore did not produce {pdf}")
+    return pdf_list
+
+
+def merge_pdfs(pdf_list, output_path):
+    """Merge multiple PDF files into a single output file (a path or a writable stream)."""
+    if len(pdf_list) == 1:
+        # Nothing to merge: pass MuseScore's output through untouched
+        with open(pdf_list[0], 'rb') as src:
+            if isinstance(output_path, (str, os.PathLike)):
+                with open(output_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.copyfileobj(src, output_path)
+        return output_path
+
+    # Source PDFs must stay open until save: copied pages still reference their objects
+    sources = [pikepdf.Pdf.open(pdf) for pdf in pdf_list]
+    try:
+        with pikepdf.Pdf.new() as merged:
+            for src in sources:
+                merged.pages.extend(src.pages)
+            merged.save(output_path)
+    finally:
+        for src in sources:
+            src.close()
     return output_path
 
 
+def request_cache_path(params):
+    """Return the cache file path for a set of request parameters."""
+    # The renderer is part of the key too, so a deploy or MuseScore change never hits stale entries
+    keyed = dict(params, cache_version=CACHE_VERSION, musescore_path=MUSESCORE_PATH)
+    digest = hashlib.blake2b(orjson.dumps(keyed, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.pdf")
+
+
+def ensure_cache_dir():
+    """Create CACHE_DIR private to this user, refusing a directory anyone else owns or can write."""
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    st = os.stat(CACHE_DIR)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(f"Cache directory {CACHE_DIR} is not private to this user")
+
+
+def load_cached_pdf(cache_path):
+    """Return a cached PDF as a BytesIO, or None on a miss; hits are marked as recently used."""
+    try:
+        ensure_cache_dir()
+        with open(cache_path, 'rb') as f:
+            pdf_buf = io.BytesIO(f.read())
+        os.utime(cache_path)
+    except OSError:
+        return None
+    return pdf_buf
+
+
+def store_cached_pdf(cache_path, pdf_bytes):
+    """Atomically write a finished PDF into the cache, then evict down to CACHE_MAX_BYTES."""
+    ensure_cache_dir()
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    evict_cached_pdfs()
+
+
+def evict_cached_pdfs():
+    """Delete the least recently used cached PDFs until the cache fits in CACHE_MAX_BYTES."""
+    entries = []
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
 # ------------------------------------------------------------------------
 # Initialize Flask application
 # ------------------------------------------------------------------------
@@ -362,32 +448,70 @@ app = Flask(__name__)
 @app.route('/generate', methods=['POST'])
 def generate():
     """POST endpoint to generate and return merged PDF of scales/arpeggios + custom rhythm."""
-    data = request.get_json()
+    try:
+        data = orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        return "Request body must be valid JSON.", 400
 
     # Extract parameters from the request JSON
-    output_folder = data.get('output_folder', './output')
-    multiple_keys = data.get('keys', ["F#", "C", "G", "A", "B", "D", "E", "Eb"])
+    output_folder = data.get('output_folder')
+    multiple_keys = data.get('keys', DEFAULT_KEYS)
     num_octaves = data.get('num_octaves', 1)
     instrument_name = data.get('instrument_name', "Alto Saxophone")
-    custom_rhythm = data.get('custom_rhythm', [[1], [0.5, 0.5]])
+    custom_rhythm = data.get('custom_rhythm', DEFAULT_CUSTOM_RHYTHM)
     custom_line_title = data.get('custom_line_title', "My Custom Rhythm (Standard Staff)")
 
-    # Generate PDFs
-    scales_pdf = generate_scales_arpeggios_pdf(output_folder, multiple_keys, num_octaves, instrument_name)
-    custom_pdf = generate_custom_rhythm_pdf(output_folder, custom_rhythm, custom_line_title, instrument_name)
+    # Identical requests are served straight from the PDF cache
+    cache_path = request_cache_path({
+        'keys': multiple_keys,
+        'num_octaves': num_octaves,
+        'instrument_name': instrument_name,
+        'custom_rhythm': custom_rhythm,
+        'custom_line_title': custom_line_title,
+    })
+    allinone_buf = load_cached_pdf(cache_path)
+    if allinone_buf is None:
+        # Intermediate files live in a per-request scratch directory; the merged PDF stays in memory
+        allinone_buf = io.BytesIO()
+        with tempfile.TemporaryDirectory(dir=SCRATCH_DIR) as tmp:
+            # Write MusicXML in-process for each non-empty section, then render with one MuseScore launch
+            xml_list = []
+            if multiple_keys:
+                xml_list.append(generate_scales_arpeggios_xml(tmp, multiple_keys, num_octaves, instrument_name))
+            if custom_rhythm:
+                xml_list.append(generate_custom_rhythm_xml(tmp, custom_rhythm, custom_line_title, instrument_name))
+            if not xml_list:
+                return "Nothing to render: 'keys' and 'custom_rhythm' are both empty.", 400
+            try:
+                pdf_list = render_pdfs_batch(xml_list)
+            except subprocess.TimeoutExpired:
+                app.logger.error("MuseScore timed out after %s seconds", MUSESCORE_TIMEOUT)
+                return "Rendering timed out.", 504
+
+            # Merge PDFs into one (a single section is passed through as-is)
+            merge_pdfs(pdf_list, allinone_buf)
+        try:
+            store_cached_pdf(cache_path, allinone_buf.getvalue())
+        except OSError:
+            # A read-only or full cache only costs future hits, not this response
+            app.logger.warning("Could not cache PDF at %s", cache_path, exc_info=True)
 
-    # Merge PDFs into one
-    allinone_pdf = os.path.join(output_folder, "AllInOne.pdf")
-    merge_pdfs([scales_pdf, custom_pdf], allinone_pdf)
+    # Only persist a copy when the caller explicitly asks for one
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+        with open(os.path.join(output_folder, "AllInOne.pdf"), 'wb') as f:
+            f.write(allinone_buf.getbuffer())
 
     # Return the combined PDF directly as a response
-    return send_file(allinone_pdf, mimetype='application/pdf', as_attachment=True, download_name='AllInOne.pdf')
+    allinone_buf.seek(0)
+    return send_file(allinone_buf, mimetype='application/pdf', as_attachment=True, download_name='AllInOne.pdf')
 
 
 if __name__ == '__main__':
     # For Google Cloud Run or other environments, bind to 0.0.0.0 and get PORT from environment
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Local runs only; the container serves the app through gunicorn (see Dockerfile)
+    app.run(host='0.0.0.0', port=port, threaded=True)
 """ 
 envaz@Ashers-Air numbers_to_pdf % curl -X POST \
   http://localhost:8080/generate \